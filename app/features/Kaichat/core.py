@@ -2,7 +2,9 @@ from langchain_google_vertexai import VertexAI
 from langchain.prompts import PromptTemplate
 from services.schemas import ChatMessage, Message
 import os
+from functools import lru_cache
 
+@lru_cache(maxsize=32)
 def read_text_file(file_path):
     # Get the directory containing the script file
     script_dir = os.path.dirname(os.path.abspath(__file__))
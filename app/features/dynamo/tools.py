@@ -9,6 +9,7 @@ from api.error_utilities import VideoTranscriptError
 from fastapi import HTTPException
 from services.logger import setup_logger
 import os
+from functools import lru_cache
 
 
 logger = setup_logger(__name__)
@@ -17,6 +18,7 @@ logger = setup_logger(__name__)
 model = VertexAI(model="gemini-1.0-pro")
 
 
+@lru_cache(maxsize=32)
 def read_text_file(file_path):
     # Get the directory containing the script file
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -1,13 +1,17 @@
 from services.tool_registry import ToolFile
 from services.logger import setup_logger
 from features.quizzify.tools import RAGpipeline
-from features.quizzify.tools import QuizBuilder
+from features.quizzify.tools import QuizBuilder, MAX_NUM_QUESTIONS
 from api.error_utilities import LoaderError, ToolExecutorError
 
 logger = setup_logger()
 
 def executor(files: list[ToolFile], topic: str, num_questions: int, verbose=False):
     
+    # Reject invalid input before any file is downloaded or embedded
+    if num_questions > MAX_NUM_QUESTIONS:
+        raise ToolExecutorError(f"Number of questions cannot exceed {MAX_NUM_QUESTIONS}")
+
     try:
         if verbose: logger.debug(f"Files: {files}")
 
@@ -19,8 +23,8 @@ def executor(files: list[ToolFile], topic: str, num_questions: int, verbose=Fals
         # Process the uploaded files
         db = pipeline(files)
         
-        # Create and return the quiz questions
-        output = QuizBuilder(db, topic, verbose=verbose).create_questions(num_questions)
+        # Create and return the quiz questions; the default pipeline's store only serves this request
+        output = QuizBuilder(db, topic, cleanup=True, verbose=verbose).create_questions(num_questions)
     
     except LoaderError as e:
         error_message = e
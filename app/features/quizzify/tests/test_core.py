@@ -0,0 +1,12 @@
+import pytest
+from unittest.mock import patch
+from services.tool_registry import ToolFile
+from features.quizzify.core import executor
+from api.error_utilities import ToolExecutorError
+
+@patch('features.quizzify.core.RAGpipeline')
+def test_executor_rejects_too_many_questions_before_loading(mock_pipeline):
+    with pytest.raises(ToolExecutorError):
+        executor([ToolFile(url="https://example.com/test.pdf")], "neural networks", 11)
+
+    mock_pipeline.assert_not_called()
@@ -0,0 +1,38 @@
+from unittest.mock import patch, MagicMock
+from google.api_core.exceptions import ResourceExhausted
+from langchain_community.embeddings import FakeEmbeddings
+from features.quizzify.tools import BatchedEmbeddings, MemoryCachedEmbeddings, RAGpipeline
+
+def test_batched_embeddings_splits_requests():
+    embedding_model = MagicMock()
+    embedding_model.embed_documents.side_effect = lambda texts: [[float(len(text))] for text in texts]
+
+    vectors = BatchedEmbeddings(embedding_model, batch_size=2).embed_documents(["a", "bb", "ccc", "dddd", "eeeee"])
+
+    assert vectors == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert embedding_model.embed_documents.call_count == 3
+
+@patch('time.sleep')
+def test_batched_embeddings_retries_rate_limited_batches(mock_sleep):
+    embedding_model = MagicMock()
+    embedding_model.embed_documents.side_effect = [ResourceExhausted("quota"), [[1.0], [2.0]], [[3.0]]]
+
+    vectors = BatchedEmbeddings(embedding_model, batch_size=2, max_workers=1).embed_documents(["a", "bb", "ccc"])
+
+    assert vectors == [[1.0], [2.0], [3.0]]
+    assert mock_sleep.call_count == 1
+
+def test_memory_cached_embeddings_only_embeds_unseen_texts():
+    embedding_model = MagicMock()
+    embedding_model.embed_documents.side_effect = lambda texts: [[float(len(text))] for text in texts]
+    cached = MemoryCachedEmbeddings(embedding_model, namespace="test-memory-cache")
+
+    assert cached.embed_documents(["a", "bb", "a"]) == [[1.0], [2.0], [1.0]]
+    assert cached.embed_documents(["bb", "ccc"]) == [[2.0], [3.0]]
+    assert [call.args[0] for call in embedding_model.embed_documents.call_args_list] == [["a", "bb"], ["ccc"]]
+
+def test_rag_pipeline_caches_embeddings_in_memory_by_default():
+    pipeline = RAGpipeline(embedding_model=FakeEmbeddings(size=8))
+
+    assert isinstance(pipeline.embedding_model, MemoryCachedEmbeddings)
+    assert isinstance(pipeline.embedding_model.embedding_model, BatchedEmbeddings)
@@ -1,55 +1,48 @@
 import pytest
+import tempfile
 from unittest.mock import patch, MagicMock
 from services.tool_registry import ToolFile
-from features.quizzify.tools import URLLoader, BytesFilePDFLoader, Document  # Adjust the import path as necessary
+from features.quizzify.tools import URLLoader, BytesFilePDFLoader, LocalFileLoader  # Adjust the import path as necessary
 
-@pytest.fixture
+# Parsed by every URL test, so read it from disk once
+with open("features/quizzify/tests/test.pdf", 'rb') as _pdf_file:
+    _PDF_BYTES = _pdf_file.read()
+
+@pytest.fixture(scope="module")
 def pdf_loader():
     return BytesFilePDFLoader
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def url_loader(pdf_loader):
     return URLLoader(file_loader=pdf_loader, expected_file_type="pdf")
 
-@patch('requests.get')
-def test_load_pdf_from_url(mock_get, url_loader):
-    
-    pdf_file_path = "features/quizzify/tests/test.pdf"
-    
-    with open(pdf_file_path, 'rb') as file:
-        mock_pdf_content = file.read()
-    
-    # Mocking the response of requests.get
+@pytest.fixture
+def mock_pdf_response():
+    # Mocking the response of the loader session's get to simulate downloading the PDF
     mock_response = MagicMock()
+    mock_response.__enter__.return_value = mock_response
     mock_response.status_code = 200
-    mock_response.content = mock_pdf_content
-    mock_get.return_value = mock_response
+    mock_response.iter_content.return_value = [_PDF_BYTES[:256], _PDF_BYTES[256:]]
+    return mock_response
 
-    # The URL you're testing with (doesn't matter in this case since it's mocked)
-    test_url = "https://example.com/test.pdf"
+@patch('requests.Session.get')
+def test_load_pdf_from_url_with_fixture_loader(mock_get, url_loader, mock_pdf_response):
+    mock_get.return_value = mock_pdf_response
 
-    # Assuming your Document class has a simple structure for this example
-    expected_document = Document(page_content="Mock PDF Content", metadata={"source": "pdf", "page_number": 1})
+    # The URL you're testing with (doesn't matter in this case since it's mocked)
+    tool_file = ToolFile(url="https://example.com/test.pdf")
 
     # Run the loader
-    documents = url_loader.load([test_url])
+    documents = url_loader.load([tool_file])
 
     # Verify the results
     assert isinstance(documents, list)
     assert len(documents) == 1
+    assert documents[0].metadata == {"source": "pdf", "page_number": 1}
 
-@patch('requests.get')
-def test_load_pdf_from_url(mock_get):
-    # Simulate reading a local PDF file or use mock PDF content
-    pdf_file_path = "features/quizzify/tests/test.pdf"
-    with open(pdf_file_path, 'rb') as pdf_file:
-        pdf_content = pdf_file.read()
-
-    # Mocking the response of requests.get to simulate downloading the PDF
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.content = pdf_content
-    mock_get.return_value = mock_response
+@patch('requests.Session.get')
+def test_load_pdf_from_url(mock_get, mock_pdf_response):
+    mock_get.return_value = mock_pdf_response
 
     # The specific URL you want to test with
     test_url = "https://firebasestorage.googleapis.com/v0/b/kai-ai-f63c8.appspot.com/o/uploads%2F510f946e-823f-42d7-b95d-d16925293946-Linear%20Regression%20Stat%20Yale.pdf?alt=media&token=caea86aa-c06b-4cde-9fd0-42962eb72ddd"
@@ -63,4 +56,36 @@ def test_load_pdf_from_url(mock_get):
     
     # Verify the results
     assert isinstance(documents, list)
-    assert len(documents) == 1
\ No newline at end of file
+    assert len(documents) == 1
+
+def test_local_file_loader_preserves_file_order():
+    file_paths = ["features/quizzify/tests/test.pdf", "api/tests/linear_regression.pdf", "api/tests/test.pdf"]
+
+    documents = LocalFileLoader(file_paths).load()
+
+    assert [doc.metadata["source"] for doc in documents] == [file_paths[0]] + [file_paths[1]] * 3 + [file_paths[2]]
+    assert [doc.metadata["page_number"] for doc in documents] == [1, 1, 2, 3, 1]
+
+def test_local_file_loader_rejects_unexpected_file_type():
+    with pytest.raises(ValueError):
+        LocalFileLoader(["features/quizzify/tests/test.pdf", "features/quizzify/metadata.json"]).load()
+
+@patch('requests.Session.get')
+def test_url_loader_skips_unexpected_file_type_without_downloading(mock_get, mock_pdf_response):
+    mock_get.return_value = mock_pdf_response
+
+    documents = URLLoader().load([ToolFile(url="https://example.com/notes.docx"), ToolFile(url="https://example.com/test.pdf")])
+
+    assert len(documents) > 0
+    mock_get.assert_called_once()
+    assert mock_get.call_args.args[0] == "https://example.com/test.pdf"
+
+def test_bytes_file_pdf_loader_closes_files():
+    file = tempfile.SpooledTemporaryFile(max_size=16)
+    file.write(_PDF_BYTES)
+    file.seek(0)
+
+    documents = BytesFilePDFLoader([(file, "pdf")]).load()
+
+    assert len(documents) == 1
+    assert file.closed
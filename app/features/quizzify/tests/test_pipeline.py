@@ -0,0 +1,134 @@
+import json
+import shutil
+import threading
+import pytest
+from io import BytesIO
+from unittest.mock import patch
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_chroma import Chroma
+from services.tool_registry import ToolFile
+from features.quizzify.tools import URLLoader, LocalFileLoader, RAGpipeline, ChunkingStrategy
+from services.pdf_extraction import extract_pdf_pages
+
+def test_split_loaded_documents_matches_split_documents():
+    pipeline = RAGpipeline(loader=LocalFileLoader(), embedding_model=FakeEmbeddings(size=8))
+    documents = LocalFileLoader(["features/quizzify/CNN.pdf"]).load()
+
+    assert pipeline.split_loaded_documents(documents) == pipeline.splitter.split_documents(documents)
+
+def test_large_chunking_produces_fewer_chunks():
+    documents = LocalFileLoader(["features/quizzify/CNN.pdf"]).load()
+    fast = RAGpipeline(embedding_model=FakeEmbeddings(size=8), chunking_strategy=ChunkingStrategy.FAST)
+    large = RAGpipeline(embedding_model=FakeEmbeddings(size=8), chunking_strategy="large")
+
+    assert len(large.split_loaded_documents(documents)) < len(fast.split_loaded_documents(documents))
+
+@patch('features.quizzify.tools.SPLIT_WINDOW_SIZE', 4)
+def test_rag_pipeline_embeds_every_window():
+    # Pages arrive in several windows, so the store is built from the first and extended with the rest
+    # A small batch size makes the chunks reach the store in several flushes
+    pipeline = RAGpipeline(loader=LocalFileLoader(), embedding_model=FakeEmbeddings(size=8), batch_size=2)
+    pipeline.compile()
+
+    vectorstore = pipeline(["features/quizzify/CNN.pdf"])
+
+    expected = pipeline.split_loaded_documents(LocalFileLoader(["features/quizzify/CNN.pdf"]).load())
+    assert len(vectorstore.similarity_search("network", k=len(expected) + 10)) == len(expected)
+
+class SignallingEmbeddings(Embeddings):
+    def __init__(self):
+        self.called = threading.Event()
+
+    def embed_documents(self, texts):
+        self.called.set()
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+def test_rag_pipeline_embeds_first_file_while_later_files_download():
+    embedding_model = SignallingEmbeddings()
+    waited_for_embedding = []
+
+    def download(url):
+        if url.endswith("second.pdf"):
+            # Only completes early if the first file's chunks are embedded while this download is still running
+            waited_for_embedding.append(embedding_model.called.wait(timeout=10))
+            file_path = "features/quizzify/tests/test.pdf"
+        else:
+            file_path = "features/quizzify/CNN.pdf"
+        with open(file_path, 'rb') as pdf_file:
+            return 200, BytesIO(pdf_file.read())
+
+    pipeline = RAGpipeline(loader=URLLoader(), embedding_model=embedding_model, batch_size=2)
+    with patch.object(URLLoader, "_download", side_effect=download):
+        vectorstore = pipeline([ToolFile(url="https://example.com/first.pdf"), ToolFile(url="https://example.com/second.pdf")])
+
+    expected = pipeline.split_loaded_documents(LocalFileLoader(["features/quizzify/CNN.pdf", "features/quizzify/tests/test.pdf"]).load())
+    assert waited_for_embedding == [True]
+    assert len(vectorstore.similarity_search("network", k=len(expected) + 10)) == len(expected)
+
+def test_rag_pipeline_manifest_skips_unchanged_files(tmp_path):
+    vectorstore = Chroma(collection_name="manifest-test", embedding_function=FakeEmbeddings(size=8))
+    manifest_path = str(tmp_path / "manifest.db")
+
+    def ingest():
+        pipeline = RAGpipeline(loader=LocalFileLoader(), embedding_model=FakeEmbeddings(size=8), manifest_path=manifest_path, vectorstore=vectorstore)
+        pipeline.compile()
+        return pipeline(["features/quizzify/tests/test.pdf"])
+
+    num_chunks = ingest()._collection.count()
+
+    # The unchanged file is not parsed again, and its chunks from the first run are still in the store
+    with patch('features.quizzify.tools.extract_pdf_pages', wraps=extract_pdf_pages) as mock_extract:
+        assert ingest()._collection.count() == num_chunks > 0
+    mock_extract.assert_not_called()
+
+def test_rag_pipeline_manifest_replaces_chunks_of_changed_files(tmp_path):
+    vectorstore = Chroma(collection_name="manifest-changed-test", embedding_function=FakeEmbeddings(size=8))
+    manifest_path = str(tmp_path / "manifest.db")
+    file_path = str(tmp_path / "doc.pdf")
+
+    def ingest():
+        pipeline = RAGpipeline(loader=LocalFileLoader(), embedding_model=FakeEmbeddings(size=8), manifest_path=manifest_path, vectorstore=vectorstore)
+        pipeline.compile()
+        return pipeline([file_path])
+
+    shutil.copy("features/quizzify/tests/test.pdf", file_path)
+    ingest()
+
+    # Editing the file replaces its chunks instead of adding to them
+    shutil.copy("api/tests/linear_regression.pdf", file_path)
+    num_chunks = ingest()._collection.count()
+
+    expected = RAGpipeline(embedding_model=FakeEmbeddings(size=8)).split_loaded_documents(LocalFileLoader([file_path]).load())
+    assert num_chunks == len(expected)
+    assert ingest()._collection.count() == num_chunks
+
+def test_rag_pipeline_manifest_requires_vectorstore(tmp_path):
+    with pytest.raises(ValueError):
+        RAGpipeline(embedding_model=FakeEmbeddings(size=8), manifest_path=str(tmp_path / "manifest.db"))
+
+def test_rag_pipeline_persist_directory_keeps_chunks_across_pipelines(tmp_path):
+    def ingest():
+        pipeline = RAGpipeline(loader=LocalFileLoader(), embedding_model=FakeEmbeddings(size=8), persist_directory=str(tmp_path))
+        pipeline.compile()
+        return pipeline(["features/quizzify/tests/test.pdf"])
+
+    num_chunks = ingest()._collection.count()
+
+    assert num_chunks > 0
+    assert ingest()._collection.count() == 2 * num_chunks
+
+@patch('features.quizzify.tools.SPLIT_WINDOW_SIZE', 4)
+def test_rag_pipeline_manifest_keeps_chunks_from_every_window(tmp_path):
+    pipeline = RAGpipeline(loader=LocalFileLoader(), embedding_model=FakeEmbeddings(size=8), manifest_path=str(tmp_path / "manifest.db"), persist_directory=str(tmp_path / "store"))
+    pipeline.compile()
+
+    vectorstore = pipeline(["features/quizzify/CNN.pdf"])
+
+    expected = len(pipeline.split_loaded_documents(LocalFileLoader(["features/quizzify/CNN.pdf"]).load()))
+    (chunk_ids,) = pipeline._manifest.execute("SELECT chunk_ids FROM files").fetchone()
+    assert vectorstore._collection.count() == expected
+    assert len(json.loads(chunk_ids)) == expected
@@ -0,0 +1,24 @@
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.llms import FakeListLLM
+from langchain_chroma import Chroma
+from features.quizzify.tools import QuizBuilder
+
+def test_quiz_builder_counts_unparseable_responses_as_failed_attempts():
+    question = '{"question": "q", "choices": [{"key": "A", "value": "a"}], "answer": "A", "explanation": "e"}'
+    vectorstore = Chroma.from_texts(["Convolutional networks share weights."], FakeEmbeddings(size=8), collection_name="quiz-builder-test")
+    builder = QuizBuilder(vectorstore, "neural networks", model=FakeListLLM(responses=["not json", question, question]))
+
+    questions = builder.create_questions(2)
+
+    assert len(questions) == 2
+    assert all(question["answer"] == "A" for question in questions)
+
+def test_quiz_builder_only_deletes_vectorstore_when_asked():
+    question = '{"question": "q", "choices": [{"key": "A", "value": "a"}], "answer": "A", "explanation": "e"}'
+    vectorstore = Chroma.from_texts(["Convolutional networks share weights."], FakeEmbeddings(size=8), collection_name="quiz-builder-cleanup-test")
+
+    QuizBuilder(vectorstore, "neural networks", model=FakeListLLM(responses=[question])).create_questions(1)
+    assert vectorstore._collection.count() == 1
+
+    QuizBuilder(vectorstore, "neural networks", model=FakeListLLM(responses=[question]), cleanup=True).create_questions(1)
+    assert "quiz-builder-cleanup-test" not in [collection.name for collection in vectorstore._client.list_collections()]
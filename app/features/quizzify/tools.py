@@ -1,31 +1,85 @@
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterable, Iterator
 from io import BytesIO
 from fastapi import UploadFile
-from pypdf import PdfReader
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from itertools import chain, islice
+from pathlib import Path
+from functools import lru_cache
+from enum import Enum
+import asyncio
+import threading
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import json
 import time
+import tempfile
+import hashlib
+import mmap
+import sqlite3
+import uuid
+from array import array
+from collections import OrderedDict
 
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
+try:
+    import faiss  # Optional; enables the in-memory FAISS vectorstore
+    from langchain_community.vectorstores import FAISS
+except ImportError:
+    FAISS = None
 from langchain_google_vertexai import VertexAIEmbeddings, VertexAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableParallel
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.pydantic_v1 import BaseModel, Field
+from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+from langchain_core.pydantic_v1 import BaseModel, Field, ValidationError
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 
 from services.logger import setup_logger
 from services.tool_registry import ToolFile
+from services.pdf_extraction import extract_pdf_pages
 from api.error_utilities import LoaderError
 
 relative_path = "features/quzzify"
 
+# Number of texts sent to the embedding API per request
+EMBEDDING_BATCH_SIZE = 100
+
+# Embedding batches sent to the API at the same time
+EMBEDDING_CONCURRENCY = int(os.environ.get("KAI_EMBED_CONCURRENCY", 8))
+
+# Attempts per embedding batch when the API is rate limiting, and the first back-off delay in seconds
+EMBEDDING_MAX_RETRIES = 5
+EMBEDDING_RETRY_DELAY = 0.5
+
+# Number of loaded pages handed to the splitter at a time
+SPLIT_WINDOW_SIZE = 64
+
+# Upper bound on concurrent LLM requests while generating quiz questions
+MAX_CONCURRENT_GENERATIONS = 8
+
+# Largest number of questions a single quiz can ask for
+MAX_NUM_QUESTIONS = 10
+
+# On-disk cache of chunk embeddings, shared by every pipeline that opts in with reuse_cache=True.
+# It is unbounded and the default temp directory is memory-backed on App Engine, so point it at real disk when enabled
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(tempfile.gettempdir(), "kai-embedding-cache"))
+
+# Number of chunk embeddings kept in memory across requests (about 6 KB each at 768 dimensions)
+EMBEDDING_MEMORY_CACHE_SIZE = int(os.environ.get("EMBEDDING_MEMORY_CACHE_SIZE", 500))
+
 logger = setup_logger(__name__)
 
+@lru_cache(maxsize=32)
 def read_text_file(file_path):
+    # Prompt files don't change while the app runs, so each one is only read from disk once
     # Get the directory containing the script file
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -35,92 +89,218 @@ def read_text_file(file_path):
     with open(absolute_file_path, 'r') as file:
         return file.read()
 
-class RAGRunnable:
-    def __init__(self, func):
-        self.func = func
-    
-    def __or__(self, other):
-        def chained_func(*args, **kwargs):
-            # Result of previous function is passed as first argument to next function
-            return other(self.func(*args, **kwargs))
-        return RAGRunnable(chained_func)
-    
-    def __call__(self, *args, **kwargs):
-        return self.func(*args, **kwargs)
+def run_sync(coroutine):
+    # Runs a coroutine from sync code; inside a running event loop (e.g. an async route) it runs on a helper thread
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+class BatchedEmbeddings(Embeddings):
+    def __init__(self, embedding_model: Embeddings, batch_size: int = EMBEDDING_BATCH_SIZE, max_workers: int = EMBEDDING_CONCURRENCY):
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        # Back off exponentially when the API reports the quota is exhausted
+        for attempt in range(EMBEDDING_MAX_RETRIES):
+            try:
+                return self.embedding_model.embed_documents(batch)
+            except (ResourceExhausted, TooManyRequests):
+                if attempt == EMBEDDING_MAX_RETRIES - 1:
+                    raise
+                time.sleep(EMBEDDING_RETRY_DELAY * 2 ** attempt)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Send fixed-size batches so a large chunk set costs a handful of API calls
+        batches = self._batches(texts)
+        if len(batches) <= 1 or self.max_workers <= 1:
+            return list(chain.from_iterable(self._embed_batch(batch) for batch in batches))
+
+        # Batches are independent, so their HTTP round-trips can overlap; map keeps the input order
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            return list(chain.from_iterable(executor.map(self._embed_batch, batches)))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding_model.embed_query(text)
+
+# Embeddings by (namespace, blake2b of chunk text), least recently used first; shared by every pipeline
+_embedding_memory_cache = OrderedDict()
+_embedding_memory_cache_lock = threading.Lock()
+
+class MemoryCachedEmbeddings(Embeddings):
+    def __init__(self, embedding_model: Embeddings, namespace: str, max_size: int = EMBEDDING_MEMORY_CACHE_SIZE):
+        self.embedding_model = embedding_model
+        self.namespace = namespace
+        self.max_size = max_size
+
+    def _key(self, text: str) -> Tuple[str, bytes]:
+        return self.namespace, hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def _lookup(self, texts: List[str]) -> Tuple[list, list, Dict[Tuple[str, bytes], str]]:
+        # Returns each text's key and cached vector (None for misses), and the distinct texts that still need embedding
+        keys = [self._key(text) for text in texts]
+        with _embedding_memory_cache_lock:
+            vectors = [_embedding_memory_cache.get(key) for key in keys]
+            for key, vector in zip(keys, vectors):
+                if vector is not None:
+                    _embedding_memory_cache.move_to_end(key)
+
+        missing = {key: text for key, text, vector in zip(keys, texts, vectors) if vector is None}
+        return keys, vectors, missing
+
+    def _store(self, keys: list, vectors: list, missing: Dict[Tuple[str, bytes], str], embedded: List[List[float]]) -> List[List[float]]:
+        # Packed doubles take a fraction of the memory of a list of float objects
+        new_vectors = {key: array("d", vector) for key, vector in zip(missing, embedded)}
+        with _embedding_memory_cache_lock:
+            _embedding_memory_cache.update(new_vectors)
+            while len(_embedding_memory_cache) > self.max_size:
+                _embedding_memory_cache.popitem(last=False)
+
+        return [list(vector if vector is not None else new_vectors[key]) for key, vector in zip(keys, vectors)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Only chunks not seen recently reach the wrapped model, and repeated chunks are embedded once
+        keys, vectors, missing = self._lookup(texts)
+        embedded = self.embedding_model.embed_documents(list(missing.values())) if missing else []
+        return self._store(keys, vectors, missing, embedded)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding_model.embed_query(text)
+
+# Seconds allowed for each file download
+URL_REQUEST_TIMEOUT = 30
+
+# Downloads are read in chunks of this size and kept in memory up to the spool size, then spill to a temp file
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+DOWNLOAD_SPOOL_BYTES = 8 * 1024 * 1024
+
+# Thread count for loading several files at once; file reads and parsing of distinct files are independent
+LOADER_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Files above this size are streamed from disk instead of being read into memory in one go
+MAX_IN_MEMORY_PDF_BYTES = 100 * 1024 * 1024
+
+def _hash_file(file_path: str) -> str:
+    # blake2b is faster than sha256 in CPython and collisions are not a concern for change detection
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return hashlib.blake2b(b"", digest_size=16).hexdigest()  # Empty files can't be mapped
+
+        # Hash straight from the page cache rather than copying the file into a bytes object first
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.blake2b(mapped, digest_size=16).hexdigest()
+
+def _prefetch_files(file_paths: List[str]):
+    # Queue kernel readahead for every file up front so their disk reads overlap
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    for file_path in file_paths:
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            continue  # Missing files are reported by the loader itself
+
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
 
 class UploadPDFLoader:
     def __init__(self, files: List[UploadFile]):
         self.files = files
 
-    def load(self) -> List[Document]:
-        documents = []
+    def _load_one(self, upload: Tuple[str, bytes]) -> List[Document]:
+        filename, data = upload
+
+        return [
+            Document(page_content=page_content, metadata={"source": filename, "page_number": i + 1})
+            for i, page_content in enumerate(extract_pdf_pages(data))
+        ]
 
+    def iter_load(self) -> Iterator[Document]:
+        # UploadFile is not thread-safe, so read every file on this thread before parsing in parallel
+        uploads = []
         for upload_file in self.files:
             with upload_file.file as pdf_file:
-                pdf_reader = PdfReader(pdf_file)
+                uploads.append((upload_file.filename, pdf_file.read()))
 
-                for i, page in enumerate(pdf_reader.pages):
-                    page_content = page.extract_text()
-                    metadata = {"source": upload_file.filename, "page_number": i + 1}
+        with ThreadPoolExecutor(max_workers=LOADER_MAX_WORKERS) as executor:
+            for documents in executor.map(self._load_one, uploads):
+                yield from documents
 
-                    doc = Document(page_content=page_content, metadata=metadata)
-                    documents.append(doc)
-
-        return documents
+    def load(self) -> List[Document]:
+        return list(self.iter_load())
 
 class BytesFilePDFLoader:
     def __init__(self, files: List[Tuple[BytesIO, str]]):
         self.files = files
     
-    def load(self) -> List[Document]:
-        documents = []
-        
+    def iter_load(self) -> Iterator[Document]:
         for file, file_type in self.files:
-            logger.debug(file_type)
             if file_type.lower() == "pdf":
-                pdf_reader = PdfReader(file) #! PyPDF2.PdfReader is deprecated
-
-                for i, page in enumerate(pdf_reader.pages):
-                    page_content = page.extract_text()
-                    metadata = {"source": file_type, "page_number": i + 1}
-
-                    doc = Document(page_content=page_content, metadata=metadata)
-                    documents.append(doc)
+                # Close each file once it is read; a download that spilled to disk holds a file descriptor until then
+                with file:
+                    pages = extract_pdf_pages(file.read())
+                yield from [
+                    Document(page_content=page_content, metadata={"source": file_type, "page_number": i + 1})
+                    for i, page_content in enumerate(pages)
+                ]
                     
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
-            
-        return documents
+
+    def load(self) -> List[Document]:
+        return list(self.iter_load())
 
 class LocalFileLoader:
-    def __init__(self, file_paths: list[str], expected_file_type="pdf"):
+    def __init__(self, file_paths: list[str] = None, expected_file_type="pdf"):
         self.file_paths = file_paths
         self.expected_file_type = expected_file_type
 
-    def load(self) -> List[Document]:
-        documents = []
-        
+    def _load_one(self, file_path: str) -> List[Document]:
+        if os.path.getsize(file_path) <= MAX_IN_MEMORY_PDF_BYTES:
+            # A single sequential read avoids pypdf's many small seek + read calls on the file handle
+            pages = extract_pdf_pages(Path(file_path).read_bytes())
+        else:
+            # Let the backend read very large files from disk as it needs them
+            pages = extract_pdf_pages(file_path)
+
+        return [
+            Document(page_content=page_content, metadata={"source": file_path, "page_number": i + 1})
+            for i, page_content in enumerate(pages)
+        ]
+
+    def iter_load(self, file_paths: list[str] = None) -> Iterator[Document]:
+        # Paths can be given per call, which lets a single loader instance back a RAGpipeline
+        file_paths = self.file_paths if file_paths is None else file_paths
+
         # Ensure file paths is a list
-        self.file_paths = [self.file_paths] if isinstance(self.file_paths, str) else self.file_paths
-    
-        for file_path in self.file_paths:
-            
-            file_type = file_path.split(".")[-1]
+        file_paths = [file_paths] if isinstance(file_paths, str) else file_paths
 
+        # Validate every file type before any file is read
+        for file_path in file_paths:
+            file_type = os.path.splitext(file_path)[1][1:].lower()
             if file_type != self.expected_file_type:
                 raise ValueError(f"Expected file type: {self.expected_file_type}, but got: {file_type}")
 
-            with open(file_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
+        _prefetch_files(file_paths)
 
-                for i, page in enumerate(pdf_reader.pages):
-                    page_content = page.extract_text()
-                    metadata = {"source": file_path, "page_number": i + 1}
+        # executor.map keeps the documents in the same order as the file paths
+        with ThreadPoolExecutor(max_workers=LOADER_MAX_WORKERS) as executor:
+            for documents in executor.map(self._load_one, file_paths):
+                yield from documents
 
-                    doc = Document(page_content=page_content, metadata=metadata)
-                    documents.append(doc)
-
-        return documents
+    def load(self, file_paths: list[str] = None) -> List[Document]:
+        return list(self.iter_load(file_paths))
 
 class URLLoader:
     def __init__(self, file_loader=None, expected_file_type="pdf", verbose=False):
@@ -128,68 +308,275 @@ class URLLoader:
         self.expected_file_type = expected_file_type
         self.verbose = verbose
 
-    def load(self, tool_files: List[ToolFile]) -> List[Document]:
-        queued_files = []
-        documents = []
-        any_success = False
+        # Pooled session so later downloads reuse kept-alive connections instead of a fresh TCP+TLS handshake
+        self._session = requests.Session()
+        self._session.headers.update({"User-Agent": "kai-ai/1.0"})
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.25))
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        # aiohttp session reused across aload calls made on the same event loop
+        self._async_session = None
+        self._async_session_loop = None
+
+    def _queue_response(self, url: str, status_code: int, file, queued_files: List[Tuple[BytesIO, str]]):
+        if status_code != 200:
+            logger.error(f"Request failed to load file from {url} and got status code {status_code}")
+            return
 
+        # Append to Queue; the file type was checked from the URL before downloading
+        queued_files.append((file, self.expected_file_type))
+        if self.verbose:
+            logger.info(f"Successfully loaded file from {url}")
+
+    def _checked_urls(self, tool_files: List[ToolFile]) -> List[str]:
+        # Check file types from the URL before any request, so a mistyped file costs no bandwidth
+        urls = []
         for tool_file in tool_files:
-            try:
-                url = tool_file.url
-                response = requests.get(url)
-                parsed_url = urlparse(url)
-                path = parsed_url.path
-
-                if response.status_code == 200:
-                    # Read file
-                    file_content = BytesIO(response.content)
-
-                    # Check file type
-                    file_type = path.split(".")[-1]
-                    if file_type != self.expected_file_type:
-                        raise LoaderError(f"Expected file type: {self.expected_file_type}, but got: {file_type}")
-
-                    # Append to Queue
-                    queued_files.append((file_content, file_type))
-                    if self.verbose:
-                        logger.info(f"Successfully loaded file from {url}")
+            file_type = urlparse(tool_file.url).path.rsplit(".", 1)[-1].lower()
+            if file_type != self.expected_file_type:
+                logger.error(f"Failed to load file from {tool_file.url}: expected file type {self.expected_file_type}, but got {file_type}")
+                continue
+            urls.append(tool_file.url)
+        return urls
 
-                    any_success = True  # Mark that at least one file was successfully loaded
-                else:
-                    logger.error(f"Request failed to load file from {url} and got status code {response.status_code}")
+    def _iter_queued(self, queued_files: List[Tuple[BytesIO, str]]) -> Iterator[Document]:
+        if not queued_files:
+            raise LoaderError("Unable to load any files from URLs")
+
+        # Pass Queue to the file loader
+        file_loader = self.loader(queued_files)
+        if hasattr(file_loader, "iter_load"):
+            return file_loader.iter_load()
+        return iter(file_loader.load())
+
+    def _download(self, url: str):
+        with self._session.get(url, stream=True, timeout=URL_REQUEST_TIMEOUT) as response:
+            # Don't read the body of a failed request
+            if response.status_code != 200:
+                return response.status_code, None
+
+            # Stream the body in chunks; large files spill to disk rather than being held in memory
+            file = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+                file.write(chunk)
+            file.seek(0)
+
+            return response.status_code, file
+
+    def iter_load(self, tool_files: List[ToolFile]) -> Iterator[Document]:
+        urls = self._checked_urls(tool_files)
+        loaded_any = False
+
+        # Downloads are network-bound, so fetch them all at once and pay roughly the slowest one's latency.
+        # Each file's pages are handed on as soon as its own download finishes, while later files are still downloading
+        with ThreadPoolExecutor(max_workers=LOADER_MAX_WORKERS) as executor:
+            futures = [executor.submit(self._download, url) for url in urls]
+
+            for url, future in zip(urls, futures):
+                queued_files = []
+                try:
+                    self._queue_response(url, *future.result(), queued_files)
+                except Exception as e:
+                    logger.error(f"Failed to load file from {url}")
+                    logger.error(e)
+                    continue
+
+                if queued_files:
+                    loaded_any = True
+                    yield from self._iter_queued(queued_files)
+
+        if not loaded_any:
+            raise LoaderError("Unable to load any files from URLs")
+
+    def load(self, tool_files: List[ToolFile]) -> List[Document]:
+        documents = list(self.iter_load(tool_files))
+
+        if self.verbose:
+            logger.info(f"Loaded {len(documents)} documents")
+
+        return documents
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # A session is bound to the event loop it was created on
+        loop = asyncio.get_running_loop()
+        if self._async_session is None or self._async_session.closed or self._async_session_loop is not loop:
+            self._async_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300))
+            self._async_session_loop = loop
+        return self._async_session
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str):
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=URL_REQUEST_TIMEOUT)) as response:
+            if response.status != 200:
+                return response.status, None
+
+            file = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                file.write(chunk)
+            file.seek(0)
 
+            return response.status, file
+
+    async def aload(self, tool_files: List[ToolFile]) -> List[Document]:
+        # Downloads every file concurrently over one pooled session, so connections are reused between files
+        session = self._get_session()
+        urls = self._checked_urls(tool_files)
+        responses = await asyncio.gather(*[self._fetch(session, url) for url in urls], return_exceptions=True)
+
+        queued_files = []
+        for url, response in zip(urls, responses):
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                self._queue_response(url, *response, queued_files)
             except Exception as e:
                 logger.error(f"Failed to load file from {url}")
                 logger.error(e)
                 continue
 
-        # Pass Queue to the file loader if there are any successful loads
-        if any_success:
-            file_loader = self.loader(queued_files)
-            documents = file_loader.load()
+        # Parsing is CPU-bound, so keep it off the event loop
+        documents = await asyncio.to_thread(lambda: list(self._iter_queued(queued_files)))
 
-            if self.verbose:
-                logger.info(f"Loaded {len(documents)} documents")
-
-        if not any_success:
-            raise LoaderError("Unable to load any files from URLs")
+        if self.verbose:
+            logger.info(f"Loaded {len(documents)} documents")
 
         return documents
 
+    async def aclose(self):
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
+        self._async_session = None
+        self._async_session_loop = None
+
+    def load_many(self, tool_files: List[ToolFile]) -> List[Document]:
+        async def load_and_close():
+            # The event loop ends with this call, so the session cannot outlive it
+            try:
+                return await self.aload(tool_files)
+            finally:
+                await self.aclose()
+
+        return run_sync(load_and_close())
+
+class ChunkingStrategy(str, Enum):
+    FAST = "fast"  # Fixed-size overlapping chunks
+    LARGE = "large"  # Twice the chunk size and no overlap; fewer chunks to embed
+
+# Chunking used by pipelines that don't pass their own splitter
+CHUNKING_STRATEGY = os.environ.get("CHUNKING_STRATEGY", ChunkingStrategy.FAST.value)
+
+# Shared defaults: building a Vertex AI client resolves credentials and sets up a new transport each time.
+# Splitters hold no per-call state, so one instance per strategy serves every pipeline.
+@lru_cache(maxsize=None)
+def _default_splitter(strategy: ChunkingStrategy = ChunkingStrategy.FAST) -> RecursiveCharacterTextSplitter:
+    if strategy == ChunkingStrategy.LARGE:
+        return RecursiveCharacterTextSplitter(separators=["\n\n", "\n", ". ", " ", ""], chunk_size=2000, chunk_overlap=0)
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+
+# The shared clients are only called through their sync APIs: their async gRPC clients are created on first use
+# and stay bound to that event loop, which a later request's loop can't reuse.
+@lru_cache(maxsize=1)
+def _default_embeddings() -> VertexAIEmbeddings:
+    return VertexAIEmbeddings(model='textembedding-gecko')
+
+@lru_cache(maxsize=1)
+def _default_model() -> VertexAI:
+    return VertexAI(model="gemini-1.0-pro")
+
 class RAGpipeline:
-    def __init__(self, loader=None, splitter=None, vectorstore_class=None, embedding_model=None, verbose=False):
-        default_config = {
-            "loader": URLLoader(verbose = verbose), # Creates instance on call with verbosity
-            "splitter": RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100),
-            "vectorstore_class": Chroma,
-            "embedding_model": VertexAIEmbeddings(model='textembedding-gecko')
-        }
-        self.loader = loader or default_config["loader"]
-        self.splitter = splitter or default_config["splitter"]
-        self.vectorstore_class = vectorstore_class or default_config["vectorstore_class"]
-        self.embedding_model = embedding_model or default_config["embedding_model"]
+    def __init__(self, loader=None, splitter=None, vectorstore_class=None, embedding_model=None, reuse_cache=False, manifest_path=None, vectorstore=None, batch_size=EMBEDDING_BATCH_SIZE, persist_directory=None, chunking_strategy=None, verbose=False):
+        # Files skipped by the manifest are only represented by chunks stored on an earlier run
+        if manifest_path and vectorstore is None and persist_directory is None:
+            raise ValueError("manifest_path requires a persistent vectorstore or persist_directory holding the chunks of previously ingested files")
+
+        # Defaults are only built when no override is given; the shared ones are reused across pipelines
+        self.loader = loader or URLLoader(verbose = verbose) # Creates instance on call with verbosity
+        self.splitter = splitter or _default_splitter(ChunkingStrategy(chunking_strategy or CHUNKING_STRATEGY))
+        # A quiz session queries its store once and discards it, so an in-memory FAISS index is enough.
+        # Chroma is kept for stores that outlive the request, which differential ingest relies on.
+        if vectorstore_class is None:
+            vectorstore_class = Chroma if persist_directory or FAISS is None else FAISS
+        self.vectorstore_class = vectorstore_class
+        embedding_model = embedding_model or _default_embeddings()
+        # Chunks are sent to the embedding API batch_size at a time rather than one request per chunk
+        self.embedding_model = BatchedEmbeddings(embedding_model, batch_size=batch_size)
+        self._batch_size = batch_size
         self.verbose = verbose
 
+        namespace = getattr(embedding_model, "model_name", type(embedding_model).__name__)
+        if reuse_cache:
+            # Chunks already embedded by this model are read back from disk instead of calling the API again
+            self.embedding_model = CacheBackedEmbeddings.from_bytes_store(
+                self.embedding_model,
+                LocalFileStore(EMBEDDING_CACHE_DIR),
+                namespace=namespace
+            )
+        # The most recently embedded chunks are served from a bounded in-memory cache shared across requests
+        self.embedding_model = MemoryCachedEmbeddings(self.embedding_model, namespace=namespace)
+
+        # Differential ingest: local files whose content hash is recorded in the manifest are not processed again,
+        # and the chunks of new or changed files are added to the given vectorstore.
+        # A Chroma store persisted in persist_directory is opened up front, and every run adds its chunks to it
+        if vectorstore is None and persist_directory:
+            vectorstore = Chroma(persist_directory=persist_directory, embedding_function=self.embedding_model)
+        self.vectorstore = vectorstore
+        # A given or persisted store is added to; otherwise each run builds a new store from its own chunks
+        self._persistent = vectorstore is not None
+        self._manifest = None
+        self._pending_hashes = {}
+        self._ids_by_source = {}
+        if manifest_path:
+            self._manifest = sqlite3.connect(manifest_path, check_same_thread=False)
+            self._manifest.execute("CREATE TABLE IF NOT EXISTS files (source TEXT PRIMARY KEY, hash TEXT NOT NULL, chunk_ids TEXT NOT NULL)")
+
+    def _skip_unchanged_files(self, files) -> list:
+        changed_files = []
+        stale_ids = []
+        self._pending_hashes = {}
+
+        for file in files:
+            # Only local paths can be hashed before loading; anything else is always processed
+            if not isinstance(file, str):
+                changed_files.append(file)
+                continue
+
+            file_hash = _hash_file(file)
+            row = self._manifest.execute("SELECT hash, chunk_ids FROM files WHERE source = ?", (file,)).fetchone()
+            if row is not None:
+                if row[0] == file_hash:
+                    if self.verbose: logger.info(f"Skipping unchanged file {file}")
+                    continue
+                # The file changed since it was ingested, so its previous chunks are replaced
+                stale_ids.extend(json.loads(row[1]))
+
+            self._pending_hashes[file] = file_hash
+            changed_files.append(file)
+
+        if stale_ids:
+            if self.verbose: logger.info(f"Deleting {len(stale_ids)} chunks of changed files")
+            self.vectorstore.delete(ids=stale_ids)
+
+        return changed_files
+
+    def _chunk_ids(self, documents: List[Document]) -> List[str]:
+        # Chunks of a tracked file get stable ids derived from its path and hash; the rest get random ids.
+        # Ids are collected per file for the whole run, so numbering carries on across windows of chunks.
+        ids = []
+        for doc in documents:
+            source = doc.metadata.get("source")
+            file_hash = self._pending_hashes.get(source)
+            if file_hash is None:
+                ids.append(str(uuid.uuid4()))
+                continue
+
+            # Copies of the same file at different paths are tracked separately, so their ids must differ too
+            id_prefix = hashlib.blake2b(f"{source}:{file_hash}".encode(), digest_size=16).hexdigest()
+            file_chunk_ids = self._ids_by_source.setdefault(source, [])
+            file_chunk_ids.append(f"{id_prefix}-{len(file_chunk_ids)}")
+            ids.append(file_chunk_ids[-1])
+
+        return ids
+
     def load_PDFs(self, files) -> List[Document]:
         if self.verbose:
             logger.info(f"Loading {len(files)} files")
@@ -197,41 +584,157 @@ class RAGpipeline:
         
         logger.debug(f"Loader is a: {type(self.loader)}")
         
+        # A new run starts numbering chunks from scratch
+        self._ids_by_source = {}
+        if self._manifest is not None:
+            files = self._skip_unchanged_files(files)
+
         try:
-            total_loaded_files = self.loader.load(files)
+            # Prefer a lazy loader so pages stream straight into the splitter
+            if hasattr(self.loader, "iter_load"):
+                total_loaded_files = self.loader.iter_load(files)
+            else:
+                total_loaded_files = self.loader.load(files)
         except LoaderError as e:
             logger.error(f"Loader experienced error: {e}")
             raise LoaderError(e)
             
         return total_loaded_files
     
-    def split_loaded_documents(self, loaded_documents: List[Document]) -> List[Document]:
+    def split_loaded_documents(self, loaded_documents: Iterable[Document]) -> List[Document]:
         if self.verbose:
-            logger.info(f"Splitting {len(loaded_documents)} documents")
+            logger.info(f"Splitting loaded documents")
             logger.info(f"Splitter type used: {type(self.splitter)}")
             
         total_chunks = []
-        chunks = self.splitter.split_documents(loaded_documents)
-        total_chunks.extend(chunks)
+        num_documents = 0
+        documents = iter(loaded_documents)
+        split_text = self.splitter.split_text
+
+        # Split in small windows so only a few source pages are held in memory at once
+        while window := list(islice(documents, SPLIT_WINDOW_SIZE)):
+            num_documents += len(window)
+            for document in window:
+                # Split the raw page text and wrap the chunks afterwards; split_documents would deep-copy
+                # the page metadata for every chunk, a shallow copy is enough for these flat dicts
+                metadata = document.metadata
+                total_chunks.extend(
+                    Document(page_content=chunk, metadata=dict(metadata))
+                    for chunk in split_text(document.page_content)
+                )
         
-        if self.verbose: logger.info(f"Split {len(loaded_documents)} documents into {len(total_chunks)} chunks")
+        if self.verbose: logger.info(f"Split {num_documents} documents into {len(total_chunks)} chunks")
         
         return total_chunks
     
+    def _add_to_vectorstore(self, documents: List[Document], new_store: bool):
+        if not self._persistent:
+            # One-shot stores are built from a run's first chunks and extended with the rest
+            if new_store:
+                self.vectorstore = self.vectorstore_class.from_documents(documents, self.embedding_model)
+            elif documents:
+                self.vectorstore.add_documents(documents)
+        elif documents:
+            self.vectorstore.add_documents(documents, ids=self._chunk_ids(documents))
+
+    def _record_manifest(self):
+        # Written once at the end of a run, so each file's row lists the ids of all of its chunks
+        if self._manifest is None:
+            return
+
+        # Every processed file gets a row, including one that now yields no chunks
+        with self._manifest:
+            self._manifest.executemany(
+                "INSERT OR REPLACE INTO files (source, hash, chunk_ids) VALUES (?, ?, ?)",
+                [
+                    (source, file_hash, json.dumps(self._ids_by_source.get(source, [])))
+                    for source, file_hash in self._pending_hashes.items()
+                ]
+            )
+        self._ids_by_source = {}
+
     def create_vectorstore(self, documents: List[Document]):
         if self.verbose:
             logger.info(f"Creating vectorstore from {len(documents)} documents")
         
-        self.vectorstore = self.vectorstore_class.from_documents(documents, self.embedding_model)
+        self._add_to_vectorstore(documents, new_store=True)
+        self._record_manifest()
 
         if self.verbose: logger.info(f"Vectorstore created")
         return self.vectorstore
-    
+
+    async def _run(self, files):
+        # Producer/consumer: files are downloaded and parsed on a worker thread while
+        # earlier windows of pages are split and embedded, so network waits overlap with embedding
+        loop = asyncio.get_running_loop()
+        # Bounded, so the loader can only run one window of pages ahead of the splitter
+        queue = asyncio.Queue(maxsize=SPLIT_WINDOW_SIZE)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            # Waits while the queue is full, and gives up once the consumer has stopped
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=0.1)
+                    return True
+                except FuturesTimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        return False
+
+        def produce():
+            try:
+                for document in self.load_PDFs(files):
+                    if not put(document):
+                        return
+            finally:
+                # None marks the end of the pages
+                put(None)
+
+        async def consume():
+            new_store = True
+            pending_chunks = []
+            done = False
+            while not done:
+                # A window ends once the loader has no more pages ready, e.g. while the next file downloads
+                window = [await queue.get()]
+                while len(window) < SPLIT_WINDOW_SIZE and not queue.empty():
+                    window.append(queue.get_nowait())
+                if window[-1] is None:
+                    window.pop()
+                    done = True
+
+                if window:
+                    pending_chunks.extend(await asyncio.to_thread(self.split_loaded_documents, window))
+
+                # Embed each window while the loader carries on, once it fills at least one embedding request
+                if pending_chunks and (done or len(pending_chunks) >= self._batch_size):
+                    await asyncio.to_thread(self._add_to_vectorstore, pending_chunks, new_store)
+                    pending_chunks = []
+                    new_store = False
+
+            return new_store
+
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        try:
+            nothing_embedded = await consume()
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            # Loader errors surface here, ahead of anything the consumer did with no pages
+            await producer
+
+        if nothing_embedded:
+            # Keep the behaviour of building from an empty chunk list
+            await asyncio.to_thread(self._add_to_vectorstore, [], True)
+
+        self._record_manifest()
+        return self.vectorstore
+
     def compile(self):
-        # Compile the pipeline
-        self.load_PDFs = RAGRunnable(self.load_PDFs)
-        self.split_loaded_documents = RAGRunnable(self.split_loaded_documents)
-        self.create_vectorstore = RAGRunnable(self.create_vectorstore)
+        # The stages are not composed: _run streams pages between them. Kept so existing callers can still compile first.
         if self.verbose: logger.info(f"Completed pipeline compilation")
     
     def __call__(self, documents):
@@ -241,35 +744,40 @@ class RAGpipeline:
             logger.info(f"Executing pipeline")
             logger.info(f"Start of Pipeline received: {len(documents)} documents of type {type(documents[0])}")
         
-        pipeline = self.load_PDFs | self.split_loaded_documents | self.create_vectorstore
-        return pipeline(documents)
+        return run_sync(self._run(documents))
 
 class QuizBuilder:
-    def __init__(self, vectorstore, topic, prompt=None, model=None, parser=None, verbose=False):
-        default_config = {
-            "model": VertexAI(model="gemini-1.0-pro"),
-            "parser": JsonOutputParser(pydantic_object=QuizQuestion),
-            "prompt": read_text_file("prompt/quizzify-prompt.txt")
-        }
-        
-        self.prompt = prompt or default_config["prompt"]
-        self.model = model or default_config["model"]
-        self.parser = parser or default_config["parser"]
+    def __init__(self, vectorstore, topic, prompt=None, model=None, parser=None, cleanup=False, verbose=False):
+        # Fail before any defaults are built, which reads the prompt file and creates a model client
+        if vectorstore is None: raise ValueError("Vectorstore must be provided")
+        if topic is None: raise ValueError("Topic must be provided")
+
+        self.prompt = prompt or read_text_file("prompt/quizzify-prompt.txt")
+        self.model = model or _default_model()
+        self.parser = parser or JsonOutputParser(pydantic_object=QuizQuestion)
         
         self.vectorstore = vectorstore
         self.topic = topic
+        # Only a store built for this quiz alone may be deleted afterwards; a given or persisted one is kept
+        self.cleanup = cleanup
         self.verbose = verbose
-        
-        if vectorstore is None: raise ValueError("Vectorstore must be provided")
-        if topic is None: raise ValueError("Topic must be provided")
-    
-    def compile(self):
-        # Return the chain
-        prompt = PromptTemplate(
+
+        # Rendering the JSON schema is not free, so the template is built once per builder
+        self._prompt_template = self._build_prompt_template()
+        self._chain = None
+        self._chain_key = None
+
+    def _build_prompt_template(self) -> PromptTemplate:
+        return PromptTemplate(
             template=self.prompt,
             input_variables=["topic"],
             partial_variables={"format_instructions": self.parser.get_format_instructions()}
         )
+    
+    def _build_chain(self):
+        # Only rebuild the template if the prompt was replaced after construction
+        if self._prompt_template.template != self.prompt:
+            self._prompt_template = self._build_prompt_template()
         
         retriever = self.vectorstore.as_retriever()
         
@@ -277,69 +785,88 @@ class QuizBuilder:
             {"context": retriever, "topic": RunnablePassthrough()}
         )
         
-        chain = runner | prompt | self.model | self.parser
+        chain = runner | self._prompt_template | self.model | self.parser
         
         if self.verbose: logger.info(f"Chain compilation complete")
         
         return chain
 
+    def compile(self):
+        # Return the chain, only rebuilding it when the prompt or vectorstore has changed since the last build
+        chain_key = (self.prompt, id(self.vectorstore))
+
+        if self._chain is None or self._chain_key != chain_key:
+            self._chain = self._build_chain()
+            self._chain_key = chain_key
+
+        return self._chain
+
     def validate_response(self, response: Dict) -> bool:
         try:
-            # Assuming the response is already a dictionary
-            if isinstance(response, dict):
-                if 'question' in response and 'choices' in response and 'answer' in response and 'explanation' in response:
-                    choices = response['choices']
-                    if isinstance(choices, dict):
-                        for key, value in choices.items():
-                            if not isinstance(key, str) or not isinstance(value, str):
-                                return False
-                        return True
-            return False
-        except TypeError as e:
+            # The model sometimes returns choices as a {key: value} mapping rather than a list of pairs
+            if isinstance(response, dict) and isinstance(response.get('choices'), dict):
+                response = {**response, 'choices': self.format_choices(response['choices'])}
+
+            # Validate against the same schema the prompt asks the model to follow
+            QuizQuestion.parse_obj(response)
+            return True
+        except (ValidationError, TypeError) as e:
             if self.verbose:
-                logger.error(f"TypeError during response validation: {e}")
+                logger.error(f"Response failed validation: {e}")
             return False
 
     def format_choices(self, choices: Dict[str, str]) -> List[Dict[str, str]]:
         return [{"key": k, "value": v} for k, v in choices.items()]
     
+    def _check_num_questions(self, num_questions: int):
+        if num_questions > MAX_NUM_QUESTIONS:
+            raise ValueError(f"Number of questions cannot exceed {MAX_NUM_QUESTIONS}")
+
     def create_questions(self, num_questions: int = 5) -> List[Dict]:
+        self._check_num_questions(num_questions)
+
         if self.verbose: logger.info(f"Creating {num_questions} questions")
         
-        if num_questions > 10:
-            return {"message": "error", "data": "Number of questions cannot exceed 10"}
-        
         chain = self.compile()
+        # Generations run on threads; bound in-flight requests to respect the model provider's rate limits
+        batch_config = {"max_concurrency": MAX_CONCURRENT_GENERATIONS}
         
         generated_questions = []
         attempts = 0
         max_attempts = num_questions * 5  # Allow for more attempts to generate questions
 
         while len(generated_questions) < num_questions and attempts < max_attempts:
-            response = chain.invoke(self.topic)
-            if self.verbose:
-                logger.info(f"Generated response attempt {attempts + 1}: {response}")
-            
-            # Directly check if the response format is valid
-            if self.validate_response(response):
-                response["choices"] = self.format_choices(response["choices"])
-                generated_questions.append(response)
-                if self.verbose:
-                    logger.info(f"Valid question added: {response}")
-                    logger.info(f"Total generated questions: {len(generated_questions)}")
-            else:
+            # Generations are independent, so request twice the shortfall at once to absorb invalid responses.
+            # A generation that fails (e.g. unparseable output) comes back as its exception and counts as a failed attempt.
+            num_requests = min((num_questions - len(generated_questions)) * 2, max_attempts - attempts)
+            responses = chain.batch([self.topic] * num_requests, config=batch_config, return_exceptions=True)
+
+            for response in responses:
                 if self.verbose:
-                    logger.warning(f"Invalid response format. Attempt {attempts + 1} of {max_attempts}")
-            
-            # Move to the next attempt regardless of success to ensure progress
-            attempts += 1
+                    logger.info(f"Generated response attempt {attempts + 1}: {response}")
+                
+                # Directly check if the response format is valid
+                if not isinstance(response, Exception) and self.validate_response(response):
+                    if isinstance(response["choices"], dict):
+                        response["choices"] = self.format_choices(response["choices"])
+                    generated_questions.append(response)
+                    if self.verbose:
+                        logger.info(f"Valid question added: {response}")
+                        logger.info(f"Total generated questions: {len(generated_questions)}")
+                else:
+                    if self.verbose:
+                        logger.warning(f"Invalid response format. Attempt {attempts + 1} of {max_attempts}")
+                
+                attempts += 1
 
         # Log if fewer questions are generated
         if len(generated_questions) < num_questions:
             logger.warning(f"Only generated {len(generated_questions)} out of {num_questions} requested questions")
         
-        if self.verbose: logger.info(f"Deleting vectorstore")
-        self.vectorstore.delete_collection()
+        # In-memory stores such as FAISS are freed with the builder and have no collection to delete
+        if self.cleanup and hasattr(self.vectorstore, "delete_collection"):
+            if self.verbose: logger.info(f"Deleting vectorstore")
+            self.vectorstore.delete_collection()
         
         # Return the list of questions
         return generated_questions[:num_questions]
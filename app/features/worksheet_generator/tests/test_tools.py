@@ -0,0 +1,7 @@
+from features.worksheet_generator.tools import RAGRunnable
+
+def test_rag_runnable_composes_flat_stages():
+    pipeline = RAGRunnable(lambda x: x + 1) | RAGRunnable(lambda x: x * 2) | (lambda x: x - 3)
+
+    assert len(pipeline.funcs) == 3
+    assert pipeline(4) == 7
@@ -7,6 +7,7 @@ import requests
 import os
 import json
 import time
+from functools import lru_cache
 
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -20,11 +21,13 @@ from langchain_core.pydantic_v1 import BaseModel, Field
 from services.logger import setup_logger
 from services.tool_registry import ToolFile
 from api.error_utilities import LoaderError
+from services.pdf_extraction import extract_pdf_pages
 
 relative_path = "features/worksheet_generator"
 
 logger = setup_logger(__name__)
 
+@lru_cache(maxsize=32)
 def read_text_file(file_path):
     # Get the directory containing the script file
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -36,17 +39,21 @@ def read_text_file(file_path):
         return file.read()
 
 class RAGRunnable:
-    def __init__(self, func):
-        self.func = func
+    def __init__(self, *funcs):
+        self.funcs = list(funcs)
     
     def __or__(self, other):
-        def chained_func(*args, **kwargs):
-            # Result of previous function is passed as first argument to next function
-            return other(self.func(*args, **kwargs))
-        return RAGRunnable(chained_func)
+        # Composition flattens the stages instead of nesting closures
+        other_funcs = other.funcs if isinstance(other, RAGRunnable) else [other]
+        return RAGRunnable(*self.funcs, *other_funcs)
     
     def __call__(self, *args, **kwargs):
-        return self.func(*args, **kwargs)
+        first, *rest = self.funcs
+        result = first(*args, **kwargs)
+        for func in rest:
+            # Result of previous function is passed as first argument to next function
+            result = func(result)
+        return result
 
 class UploadPDFLoader:
     def __init__(self, files: List[UploadFile]):
@@ -232,6 +239,8 @@ class RAGpipeline:
         self.load_PDFs = RAGRunnable(self.load_PDFs)
         self.split_loaded_documents = RAGRunnable(self.split_loaded_documents)
         self.create_vectorstore = RAGRunnable(self.create_vectorstore)
+        # Compose once here rather than on every call
+        self._pipeline = self.load_PDFs | self.split_loaded_documents | self.create_vectorstore
         if self.verbose: logger.info(f"Completed pipeline compilation")
     
     def __call__(self, documents):
@@ -241,8 +250,7 @@ class RAGpipeline:
             logger.info(f"Executing pipeline")
             logger.info(f"Start of Pipeline received: {len(documents)} documents of type {type(documents[0])}")
         
-        pipeline = self.load_PDFs | self.split_loaded_documents | self.create_vectorstore
-        return pipeline(documents)
+        return self._pipeline(documents)
 
 
 
@@ -363,16 +371,18 @@ class TextOrPDFLoader:
         self.file = file
 
     def load(self) -> str:
+        # Plain text needs no PDF handling at all
         if self.text:
             return self.text
-        elif self.file:
-            with self.file.file as pdf_file:
-                pdf_reader = PdfReader(pdf_file)
-                content = "".join(page.extract_text() or "" for page in pdf_reader.pages)
-            return content
-        else:
+        if not self.file:
             raise ValueError("No text or file provided for question generation")
 
+        with self.file.file as pdf_file:
+            pages = extract_pdf_pages(pdf_file.read())
+
+        # A list lets str.join size the result in one pass; a generator is first copied into a sequence
+        return "".join([page_text or "" for page_text in pages])
+
 class QuestionGenerator:
     def __init__(self, model: VertexAI = VertexAI(model="gemini-1.0-pro"), verbose=False):
         self.model = model
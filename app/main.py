@@ -3,38 +3,48 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import os
 from api.router import router
 from services.logger import setup_logger
 from api.error_utilities import ErrorResponse
+from utils.auth import secret_manager_client
 
 logger = setup_logger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info(f"Initializing Application Startup")
+    if os.environ.get('ENV_TYPE') == "production":
+        # Create the shared client now rather than on the first authenticated request
+        secret_manager_client()
     logger.info(f"Successfully Completed Application Startup")
     
     yield
     logger.info("Application shutdown")
 
 app = FastAPI(lifespan = lifespan)
+# Comma-separated frontend origins allowed to call the API; any origin is allowed outside production
+cors_allowed_origins = os.environ.get('CORS_ALLOWED_ORIGINS')
+if not cors_allowed_origins:
+    if os.environ.get('ENV_TYPE') == "production":
+        raise RuntimeError("CORS_ALLOWED_ORIGINS must be set in production")
+    cors_allowed_origins = "*"
+cors_origins = [origin.strip() for origin in cors_allowed_origins.split(",") if origin.strip()]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["api-key", "content-type"],
+    max_age=86400, # Browsers cache the preflight response for a day
 )
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    errors = []
-    for error in exc.errors():
-        field = " -> ".join(str(loc) for loc in error['loc'])
-        message = error['msg']
-        error_detail = f"Error in field '{field}': {message}"
-        errors.append(error_detail)
-        logger.error(error_detail)  # Log the error details
+    errors = [f"Error in field '{' -> '.join(map(str, error['loc']))}': {error['msg']}" for error in exc.errors()]
+    # One log record per request rather than one per error
+    logger.error(f"Validation failed with {len(errors)} errors: {errors}")
 
     error_response = ErrorResponse(status=422, message=errors)
     return JSONResponse(
@@ -0,0 +1,189 @@
+from typing import List, Optional, Union
+from io import BytesIO
+from pypdf import PdfReader
+import pypdfium2 as pdfium
+try:
+    import pymupdf  # Optional (AGPL licensed); enables PDF_BACKEND="pymupdf"
+except ImportError:
+    pymupdf = None
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from itertools import chain
+import multiprocessing
+import threading
+import os
+
+from services.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Below this page count a PDF is extracted by one worker process rather than split across several
+MIN_PAGES_FOR_PARALLEL = 8
+
+class PypdfBackend:
+    # Pure-Python parser; slower, but tolerant of some PDFs PDFium rejects
+    lock = nullcontext()
+
+    def open(self, pdf: Union[bytes, str]):
+        return PdfReader(BytesIO(pdf) if isinstance(pdf, bytes) else pdf)
+
+    def page_count(self, document) -> int:
+        return len(document.pages)
+
+    def page_texts(self, document, start: int, stop: int) -> List[str]:
+        # document.pages builds a new page list on every access, so look it up once
+        pages = document.pages
+        return [pages[i].extract_text() for i in range(start, stop)]
+
+    def close(self, document):
+        document.close()
+
+class Pypdfium2Backend:
+    # Bindings over Google's PDFium C++ library, which is not thread-safe
+    lock = threading.Lock()
+
+    def open(self, pdf: Union[bytes, str]):
+        return pdfium.PdfDocument(pdf)
+
+    def page_count(self, document) -> int:
+        return len(document)
+
+    def page_texts(self, document, start: int, stop: int) -> List[str]:
+        texts = [None] * (stop - start)
+        get_page = document.get_page
+        for i in range(start, stop):
+            page = get_page(i)
+            try:
+                # PDFium ends lines with \r\n; normalise so splitting behaves the same for every backend
+                texts[i - start] = page.get_textpage().get_text_range().replace("\r\n", "\n")
+            finally:
+                page.close()
+        return texts
+
+    def close(self, document):
+        document.close()
+
+class PymupdfBackend:
+    # Bindings over MuPDF's C library, which is not thread-safe either
+    lock = threading.Lock()
+
+    def open(self, pdf: Union[bytes, str]):
+        return pymupdf.open(stream=pdf, filetype="pdf") if isinstance(pdf, bytes) else pymupdf.open(pdf)
+
+    def page_count(self, document) -> int:
+        return len(document)
+
+    def page_texts(self, document, start: int, stop: int) -> List[str]:
+        # Iterating the page range stays inside MuPDF rather than indexing page by page
+        return [page.get_text("text") for page in document.pages(start, stop)]
+
+    def close(self, document):
+        document.close()
+
+PDF_BACKENDS = {
+    "pypdf": PypdfBackend(),
+    "pypdfium2": Pypdfium2Backend()
+}
+if pymupdf is not None:
+    PDF_BACKENDS["pymupdf"] = PymupdfBackend()
+
+# Backend used for text extraction: pypdfium2, pymupdf (if installed) or pypdf; pypdf is always the fallback
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "pypdfium2")
+if PDF_BACKEND not in PDF_BACKENDS:
+    raise ValueError(f"Unknown or unavailable PDF backend: {PDF_BACKEND}, expected one of {sorted(PDF_BACKENDS)}")
+
+# Upper bound on page extraction worker processes
+MAX_PAGE_WORKERS = 8
+
+def _page_workers() -> int:
+    # CPUs this process may actually run on, which can be fewer than the host reports through os.cpu_count()
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return min(cpus, MAX_PAGE_WORKERS)
+
+# Process pool shared by every extraction, so concurrent loads don't each spawn their own workers
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            # The pool is created from loader threads while gRPC and server threads run, and forking a
+            # multi-threaded process is unsafe; workers start from a clean forkserver (or spawn) process instead
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _page_pool = ProcessPoolExecutor(max_workers=_page_workers(), mp_context=multiprocessing.get_context(start_method))
+        return _page_pool
+
+def _discard_page_pool(pool: ProcessPoolExecutor):
+    # A pool whose worker died (e.g. killed for running out of memory) refuses all further work,
+    # so the next extraction starts a new one
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _extract_page_range(pdf: Union[bytes, str], backend_name: str, start: int, stop: Optional[int]) -> List[str]:
+    backend = PDF_BACKENDS[backend_name]
+    with backend.lock:
+        document = backend.open(pdf)
+        try:
+            # A stop of None extracts through the last page
+            return backend.page_texts(document, start, backend.page_count(document) if stop is None else stop)
+        finally:
+            backend.close(document)
+
+def _extract_pages_with(pdf: Union[bytes, str], backend_name: str, min_pages_for_parallel: int) -> List[str]:
+    if backend_name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown or unavailable PDF backend: {backend_name}")
+
+    backend = PDF_BACKENDS[backend_name]
+    # A single CPU gains nothing from worker processes
+    if _page_workers() == 1:
+        return _extract_page_range(pdf, backend_name, 0, None)
+
+    # Loader threads share the process, so native backends are only used by one thread at a time.
+    # The lock is only held to count pages; the text itself is extracted in the worker processes,
+    # so PDFs loaded by different threads are still extracted in parallel
+    with backend.lock:
+        document = backend.open(pdf)
+        try:
+            num_pages = backend.page_count(document)
+        finally:
+            backend.close(document)
+
+    if num_pages == 0:
+        return []
+
+    # Small PDFs go to a single worker whole; large ones get one contiguous page range per worker,
+    # so each worker opens the document only once
+    num_ranges = 1 if num_pages < min_pages_for_parallel else min(_page_workers(), num_pages)
+    bounds = [num_pages * i // num_ranges for i in range(num_ranges + 1)]
+
+    pool = _get_page_pool()
+    try:
+        futures = [
+            pool.submit(_extract_page_range, pdf, backend_name, start, stop)
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+        return list(chain.from_iterable(future.result() for future in futures))
+    except BrokenProcessPool:
+        logger.warning("Page extraction worker died, extracting this PDF in-process")
+        _discard_page_pool(pool)
+        return _extract_page_range(pdf, backend_name, 0, num_pages)
+
+def extract_pdf_pages(pdf: Union[bytes, str], min_pages_for_parallel: int = MIN_PAGES_FOR_PARALLEL, backend_name: str = None) -> List[str]:
+    # Returns the text of every page in order, extracted in worker processes with large PDFs split across several.
+    # Accepts the PDF's bytes or a path, which lets very large files be read by the backend directly.
+    backend_name = backend_name or PDF_BACKEND
+    try:
+        return _extract_pages_with(pdf, backend_name, min_pages_for_parallel)
+    except Exception as e:
+        if backend_name == "pypdf":
+            raise
+        logger.warning(f"{backend_name} could not read PDF, falling back to pypdf: {e}")
+        return _extract_pages_with(pdf, "pypdf", min_pages_for_parallel)
@@ -0,0 +1,41 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from services import pdf_extraction
+from services.pdf_extraction import extract_pdf_pages
+
+@patch('services.pdf_extraction._page_workers', return_value=4)
+def test_extract_pdf_pages_parallel_matches_sequential(mock_page_workers):
+    with open("features/quizzify/CNN.pdf", 'rb') as pdf_file:
+        pdf_content = pdf_file.read()
+
+    sequential = extract_pdf_pages(pdf_content, min_pages_for_parallel=float("inf"))
+    parallel = extract_pdf_pages(pdf_content, min_pages_for_parallel=1)
+
+    assert len(parallel) == 41
+    assert parallel == sequential
+
+@patch('services.pdf_extraction._page_workers', return_value=2)
+def test_extract_pdf_pages_replaces_broken_page_pool(mock_page_workers):
+    with open("features/quizzify/CNN.pdf", 'rb') as pdf_file:
+        pdf_content = pdf_file.read()
+    sequential = extract_pdf_pages(pdf_content, min_pages_for_parallel=float("inf"))
+
+    # A worker exiting abruptly breaks the pool, as an out-of-memory kill would
+    broken_pool = pdf_extraction._get_page_pool()
+    broken_pool.submit(os._exit, 1).exception()
+
+    assert extract_pdf_pages(pdf_content, min_pages_for_parallel=1) == sequential
+    assert pdf_extraction._page_pool is not broken_pool
+    assert extract_pdf_pages(pdf_content, min_pages_for_parallel=1) == sequential
+
+@patch('services.pdf_extraction._page_workers', return_value=4)
+def test_extract_pdf_pages_from_concurrent_threads(mock_page_workers):
+    pdfs = []
+    for file_path in ["features/quizzify/CNN.pdf", "features/quizzify/tests/test.pdf", "api/tests/linear_regression.pdf"]:
+        with open(file_path, 'rb') as pdf_file:
+            pdfs.append(pdf_file.read())
+    expected = [extract_pdf_pages(pdf) for pdf in pdfs]
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        assert list(executor.map(extract_pdf_pages, pdfs * 2)) == expected * 2
@@ -1,13 +1,21 @@
 from fastapi import HTTPException, Header
 from google.cloud import secretmanager
+from functools import lru_cache
 import os
 
+@lru_cache(maxsize=1)
+def secret_manager_client():
+    """
+    Secret Manager client shared by the whole process; creating one sets up credentials and a gRPC channel.
+    """
+    return secretmanager.SecretManagerServiceClient()
+
 def access_secret_file(secret_id, version_id="latest"):
     """
     Access a secret file in Google Cloud Secret Manager and parse it.
     """
     project_id = os.environ.get('PROJECT_ID')
-    client = secretmanager.SecretManagerServiceClient()
+    client = secret_manager_client()
     name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
     response = client.access_secret_version(name=name)
     return response.payload.data.decode("UTF-8")